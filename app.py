@@ -1,13 +1,51 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import click
 import hashlib
-import pdfplumber
+import heapq
+import json
 import os
+import sys
+import time
+from array import array
+from contextlib import ExitStack, closing, contextmanager
+from collections import Counter, OrderedDict, defaultdict, deque
+from functools import lru_cache
+from queue import Full, Queue
+from itertools import combinations, islice
 import sqlite3
+import tempfile
+import threading
+import uuid
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import fitz  # PyMuPDF
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+try:
+    import pdfplumber
+except ImportError:  # backend ekstraksi opsional
+    pdfplumber = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # backend ekstraksi opsional
+    pdfium = None
+
+try:
+    import resource
+except ImportError:  # tidak tersedia di Windows; hanya untuk benchmark
+    resource = None
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:  # numpy opsional, hanya untuk engine 'numpy'
+    np = None
+
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
@@ -33,42 +71,1375 @@ def init_db():
             checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    # Kolom id dokumen ditambahkan belakangan; teks pasangan boleh NULL bila
+    # dokumen dirujuk lewat id dan isinya ada di tabel documents
+    columns = {row[1] for row in c.execute('PRAGMA table_info(hasil_cek)')}
+    for column in ('doc1_id', 'doc2_id'):
+        if column not in columns:
+            c.execute(f'ALTER TABLE hasil_cek ADD COLUMN {column} TEXT')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS documents (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            text TEXT,
+            char_count INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Mode normalisasi teks saat disimpan; id dokumen = digest teks tersebut.
+    # NULL untuk baris lama (mode tidak diketahui)
+    columns = {row[1] for row in c.execute('PRAGMA table_info(documents)')}
+    if 'normalization' not in columns:
+        c.execute('ALTER TABLE documents ADD COLUMN normalization TEXT')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            doc_id TEXT,
+            k INTEGER,
+            window_size INTEGER,
+            engine_version TEXT,
+            fingerprint_count INTEGER,
+            data BLOB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (doc_id, k, window_size, engine_version)
+        )
+    ''')
+    # Indeks terbalik untuk /search hanya berisi dokumen korpus (masuk lewat
+    # endpoint ingest). Posting memakai kunci integer: doc_key dokumen korpus
+    # dan id set parameter (k, window_size, engine_version).
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS corpus_documents (
+            doc_key INTEGER PRIMARY KEY,
+            doc_id TEXT UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS fingerprint_params (
+            id INTEGER PRIMARY KEY,
+            k INTEGER,
+            window_size INTEGER,
+            engine_version TEXT,
+            UNIQUE (k, window_size, engine_version)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS fingerprint_postings (
+            params_id INTEGER,
+            hash INTEGER,
+            doc_key INTEGER,
+            PRIMARY KEY (params_id, hash, doc_key)
+        ) WITHOUT ROWID
+    ''')
+    # Tabel fingerprint_index lama (kunci teks, berisi semua dokumen termasuk
+    # query /search) diganti; dokumen bernama di dalamnya tetap masuk korpus
+    # dan postingnya dibangun ulang oleh rebuild_fingerprint_index
+    if c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'fingerprint_index'").fetchone():
+        c.execute('''
+            INSERT OR IGNORE INTO corpus_documents (doc_id)
+            SELECT DISTINCT i.doc_id FROM fingerprint_index i
+            JOIN documents d ON d.id = i.doc_id
+            WHERE d.name IS NOT NULL
+        ''')
+        c.execute('DROP TABLE fingerprint_index')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS extraction_cache (
+            digest TEXT,
+            extractor_version TEXT,
+            text TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (digest, extractor_version)
+        )
+    ''')
+    columns = {row[1] for row in c.execute('PRAGMA table_info(extraction_cache)')}
+    if 'page_count' not in columns:
+        c.execute('ALTER TABLE extraction_cache ADD COLUMN page_count INTEGER')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            options TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS session_documents (
+            session_id TEXT,
+            position INTEGER,
+            doc_id TEXT,
+            name TEXT,
+            PRIMARY KEY (session_id, position)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT,
+            payload TEXT,
+            pairs_done INTEGER DEFAULT 0,
+            pairs_total INTEGER DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # attempt naik setiap job diklaim; hanya run dengan attempt terbaru yang
+    # boleh memperbarui job
+    columns = {row[1] for row in c.execute('PRAGMA table_info(jobs)')}
+    if 'attempt' not in columns:
+        c.execute('ALTER TABLE jobs ADD COLUMN attempt INTEGER DEFAULT 0')
     conn.commit()
     conn.close()
 
 init_db()
 
 # --- Simpan hasil ke DB ---
-def save_result_to_db(session_id, doc1_name, doc2_name, doc1_text, doc2_text, similarity):
+# rows: list (session_id, doc1_name, doc2_name, doc1_text, doc2_text, similarity,
+#             doc1_id, doc2_id)
+def save_results_to_db(rows):
+    if not rows:
+        return
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    c.execute('''
+    c.executemany('''
         INSERT INTO hasil_cek 
-        (session_id, doc1_name, doc2_name, doc1_text, doc2_text, similarity) 
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (session_id, doc1_name, doc2_name, doc1_text, doc2_text, similarity))
+        (session_id, doc1_name, doc2_name, doc1_text, doc2_text, similarity, doc1_id, doc2_id) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
     conn.commit()
     conn.close()
 
+# --- Fungsi hash shingle ---
+# Setiap hasher menerima (text, k) dan mengembalikan list hash 64-bit (int)
+# untuk setiap shingle sepanjang k karakter, berurutan dari kiri ke kanan.
+HASH_BASE = 0x100000001B3
+HASH_MASK = (1 << 64) - 1
+DEFAULT_HASHER = os.environ.get('WINNOWING_HASHER', 'rolling')
+
+HASHERS = {}
+
+def register_hasher(name):
+    def decorator(func):
+        HASHERS[name] = func
+        return func
+    return decorator
+
+@register_hasher('rolling')
+def rolling_hashes(text, k):
+    # Karp-Rabin modulo 2^64: satu lintasan, tanpa membuat substring per shingle
+    if k <= 0 or len(text) < k:
+        return []
+    codes = list(map(ord, text))
+    high = pow(HASH_BASE, k - 1, 1 << 64)
+
+    h = 0
+    for code in codes[:k]:
+        h = (h * HASH_BASE + code) & HASH_MASK
+    hashes = [h]
+    for old, new in zip(codes, codes[k:]):
+        h = ((h - old * high) * HASH_BASE + new) & HASH_MASK
+        hashes.append(h)
+    return hashes
+
+@register_hasher('sha256')
+def sha256_hashes(text, k):
+    # Mode lama (SHA-256 per shingle). 64 bit teratas digest dipakai sebagai
+    # nilai hash, sehingga urutan min() sama dengan membandingkan hexdigest.
+    if k <= 0:
+        return []
+    return [
+        int.from_bytes(hashlib.sha256(text[i:i+k].encode('utf-8')).digest()[:8], 'big')
+        for i in range(len(text) - k + 1)
+    ]
+
 # --- Algoritma Winnowing ---
-def winnowing_fingerprint(text, k, window_size):
-    shingles = [text[i:i+k] for i in range(len(text) - k + 1)]
-    hashes = [hashlib.sha256(shingle.encode('utf-8')).hexdigest() for shingle in shingles]
+DEFAULT_ENGINE = os.environ.get('WINNOWING_ENGINE', 'python')
+NUMPY_WINDOW_CHUNK = 1 << 16
+
+def winnowing_fingerprint(text, k, window_size, hasher=DEFAULT_HASHER, engine=DEFAULT_ENGINE):
+    return ENGINES[engine](text, k, window_size, hasher)
+
+def python_fingerprint(text, k, window_size, hasher):
+    hashes = HASHERS[hasher](text, k)
+    return select_fingerprints(hashes, window_size)
+
+def select_fingerprints(hashes, window_size):
+    # Minimum jendela geser dengan deque monoton, O(n). Jika ada nilai sama,
+    # dipilih minimum paling kanan, dan fingerprint hanya dicatat ketika
+    # posisi yang terpilih berubah. Hasil berupa list (hash, posisi).
+    if not hashes:
+        return []
+    window_size = max(1, min(window_size, len(hashes)))
 
     fingerprints = []
-    for i in range(len(hashes) - window_size + 1):
-        window = hashes[i:i+window_size]
-        fingerprints.append(min(window))
-    
+    window = deque()
+    last_pos = -1
+    for pos, h in enumerate(hashes):
+        while window and hashes[window[-1]] >= h:
+            window.pop()
+        window.append(pos)
+        if window[0] <= pos - window_size:
+            window.popleft()
+        if pos >= window_size - 1 and window[0] != last_pos:
+            last_pos = window[0]
+            fingerprints.append((hashes[last_pos], last_pos))
+
     return fingerprints
 
-def compare_documents(doc1, doc2, k, window_size):
-    fp1 = winnowing_fingerprint(doc1, k, window_size)
-    fp2 = winnowing_fingerprint(doc2, k, window_size)
-    
-    common_fingerprints = set(fp1) & set(fp2)
-    similarity = len(fp1 & fp2) / len(fp1 | fp2) * 100
-    return similarity
+# --- Engine vektor NumPy ---
+# Menghasilkan fingerprint yang identik dengan engine 'python'.
+def rolling_hashes_numpy(text, k):
+    if k <= 0 or len(text) < k:
+        return np.empty(0, dtype=np.uint64)
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype='<u4').astype(np.uint64)
+    count = len(codes) - k + 1
+    base = np.uint64(HASH_BASE)
+
+    # Horner per posisi shingle; perkalian uint64 otomatis modulo 2^64
+    hashes = codes[:count].copy()
+    for j in range(1, k):
+        hashes *= base
+        hashes += codes[j:j + count]
+    return hashes
+
+NUMPY_HASHERS = {'rolling': rolling_hashes_numpy}
+
+def numpy_fingerprint(text, k, window_size, hasher):
+    hashes, positions = numpy_select_fingerprints(text, k, window_size, hasher)
+    return list(zip(hashes.tolist(), positions.tolist()))
+
+def numpy_select_fingerprints(text, k, window_size, hasher):
+    if hasher in NUMPY_HASHERS:
+        hashes = NUMPY_HASHERS[hasher](text, k)
+    else:
+        hashes = np.array(HASHERS[hasher](text, k), dtype=np.uint64)
+    if len(hashes) == 0:
+        return hashes, np.empty(0, dtype=np.int64)
+    window_size = max(1, min(window_size, len(hashes)))
+
+    # Posisi minimum paling kanan di setiap jendela: argmin pada jendela
+    # yang dibalik mengembalikan kemunculan pertama = paling kanan.
+    windows = sliding_window_view(hashes, window_size)[:, ::-1]
+    positions = np.empty(len(windows), dtype=np.int64)
+    for start in range(0, len(windows), NUMPY_WINDOW_CHUNK):
+        chunk = windows[start:start + NUMPY_WINDOW_CHUNK]
+        positions[start:start + len(chunk)] = np.argmin(chunk, axis=1)
+    positions = np.arange(len(windows)) + (window_size - 1) - positions
+
+    changed = np.empty(len(positions), dtype=bool)
+    changed[0] = True
+    np.not_equal(positions[1:], positions[:-1], out=changed[1:])
+    positions = positions[changed]
+    return hashes[positions], positions
+
+ENGINES = {'python': python_fingerprint}
+if np is not None:
+    ENGINES['numpy'] = numpy_fingerprint
+
+# --- Himpunan fingerprint ringkas ---
+# Fingerprint satu dokumen disimpan sebagai hash unik yang terurut dalam
+# buffer uint64 (array('Q'), atau ndarray untuk engine 'numpy'), 8 byte per
+# fingerprint alih-alih objek str/int Python.
+def compact_fingerprint(text, k, window_size, hasher=DEFAULT_HASHER, engine=DEFAULT_ENGINE):
+    if engine == 'numpy':
+        hashes, _ = numpy_select_fingerprints(text, k, window_size, hasher)
+        return np.unique(hashes)
+    fingerprints = winnowing_fingerprint(text, k, window_size, hasher, engine)
+    return array('Q', sorted({h for h, _ in fingerprints}))
+
+def intersection_size(fp1, fp2):
+    if np is not None and (isinstance(fp1, np.ndarray) or isinstance(fp2, np.ndarray)):
+        fp1 = np.frombuffer(fp1, dtype=np.uint64) if isinstance(fp1, array) else fp1
+        fp2 = np.frombuffer(fp2, dtype=np.uint64) if isinstance(fp2, array) else fp2
+        if len(fp1) > len(fp2):
+            fp1, fp2 = fp2, fp1
+        if len(fp1) == 0:
+            return 0
+        idx = np.searchsorted(fp2, fp1)
+        idx[idx == len(fp2)] = 0
+        return int(np.count_nonzero(fp2[idx] == fp1))
+
+    # Merge linear dua buffer terurut
+    i = j = count = 0
+    len1, len2 = len(fp1), len(fp2)
+    while i < len1 and j < len2:
+        a, b = fp1[i], fp2[j]
+        if a == b:
+            count += 1
+            i += 1
+            j += 1
+        elif a < b:
+            i += 1
+        else:
+            j += 1
+    return count
+
+def jaccard_similarity(fp1, fp2):
+    common = intersection_size(fp1, fp2)
+    union = len(fp1) + len(fp2) - common
+    if union == 0:
+        return 0.0
+    return common / union * 100
+
+def compare_documents(doc1, doc2, k, window_size, hasher=DEFAULT_HASHER, engine=DEFAULT_ENGINE):
+    fp1 = compact_fingerprint(doc1, k, window_size, hasher, engine)
+    fp2 = compact_fingerprint(doc2, k, window_size, hasher, engine)
+    return jaccard_similarity(fp1, fp2)
+
+# --- Normalisasi teks ---
+DEFAULT_NORMALIZATION = os.environ.get('TEXT_NORMALIZATION', 'raw')
+
+NORMALIZERS = {
+    'raw': lambda text: text,
+    'basic': lambda text: ' '.join(text.lower().split()),
+}
+
+def normalize_text(text, mode=DEFAULT_NORMALIZATION):
+    return NORMALIZERS[mode](text)
+
+def content_digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+# --- Cache fingerprint lintas request ---
+# LRU dengan batas total byte buffer fingerprint. Kunci:
+# (digest teks ternormalisasi, k, window_size, hasher, normalisasi).
+FINGERPRINT_CACHE_BYTES = int(os.environ.get('FINGERPRINT_CACHE_BYTES', 256 * 1024 * 1024))
+
+class FingerprintCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            fingerprint = self.entries.get(key)
+            if fingerprint is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return fingerprint
+
+    def put(self, key, fingerprint):
+        nbytes = len(fingerprint) * 8
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key)) * 8
+            self.entries[key] = fingerprint
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted) * 8
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+fingerprint_cache = FingerprintCache(FINGERPRINT_CACHE_BYTES)
+
+# --- Penyimpanan fingerprint di SQLite ---
+# Dokumen disimpan dengan id = SHA-256 teks ternormalisasi, fingerprint
+# disimpan sebagai BLOB uint64 little-endian per (dokumen, k, window, versi).
+FINGERPRINT_VERSION = 1
+SQLITE_MAX_PARAMS = 500
+
+def engine_version(hasher):
+    return f'{hasher}-v{FINGERPRINT_VERSION}'
+
+def pack_fingerprint(fingerprint):
+    if np is not None and isinstance(fingerprint, np.ndarray):
+        return fingerprint.astype('<u8', copy=False).tobytes()
+    buf = array('Q', fingerprint)
+    if sys.byteorder == 'big':
+        buf.byteswap()
+    return buf.tobytes()
+
+def unpack_fingerprint(blob, engine=DEFAULT_ENGINE):
+    if engine == 'numpy':
+        return np.frombuffer(blob, dtype='<u8').astype(np.uint64)
+    buf = array('Q')
+    buf.frombytes(blob)
+    if sys.byteorder == 'big':
+        buf.byteswap()
+    return buf
+
+def load_fingerprints(doc_ids, k, window_size, hasher=DEFAULT_HASHER, engine=DEFAULT_ENGINE):
+    doc_ids = list(doc_ids)
+    found = {}
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    for start in range(0, len(doc_ids), SQLITE_MAX_PARAMS):
+        chunk = doc_ids[start:start + SQLITE_MAX_PARAMS]
+        placeholders = ', '.join('?' * len(chunk))
+        c.execute(f'''
+            SELECT doc_id, data FROM fingerprints
+            WHERE k = ? AND window_size = ? AND engine_version = ? AND doc_id IN ({placeholders})
+        ''', (k, window_size, engine_version(hasher), *chunk))
+        for doc_id, blob in c.fetchall():
+            found[doc_id] = unpack_fingerprint(blob, engine)
+    conn.close()
+    return found
+
+def signed_hashes(fingerprint):
+    # Kolom INTEGER SQLite bertanda 64-bit: uint64 disimpan sebagai int64
+    if np is not None and isinstance(fingerprint, np.ndarray):
+        return fingerprint.view(np.int64).tolist()
+    return [h - (1 << 64) if h >= (1 << 63) else h for h in fingerprint]
+
+def fingerprint_params_id(c, k, window_size, version):
+    c.execute('''
+        INSERT OR IGNORE INTO fingerprint_params (k, window_size, engine_version) VALUES (?, ?, ?)
+    ''', (k, window_size, version))
+    c.execute(
+        'SELECT id FROM fingerprint_params WHERE k = ? AND window_size = ? AND engine_version = ?',
+        (k, window_size, version)
+    )
+    return c.fetchone()[0]
+
+def index_fingerprint(c, params_id, doc_key, fingerprint):
+    c.executemany('''
+        INSERT OR IGNORE INTO fingerprint_postings (params_id, hash, doc_key) VALUES (?, ?, ?)
+    ''', ((params_id, h, doc_key) for h in signed_hashes(fingerprint)))
+
+def corpus_keys(c, doc_ids):
+    doc_ids = list(doc_ids)
+    found = {}
+    for start in range(0, len(doc_ids), SQLITE_MAX_PARAMS):
+        chunk = doc_ids[start:start + SQLITE_MAX_PARAMS]
+        placeholders = ', '.join('?' * len(chunk))
+        c.execute(f'SELECT doc_id, doc_key FROM corpus_documents WHERE doc_id IN ({placeholders})', chunk)
+        found.update(c.fetchall())
+    return found
+
+def store_fingerprints(entries, k, window_size, hasher=DEFAULT_HASHER, normalization=DEFAULT_NORMALIZATION):
+    # entries: list (doc_id, name, text, fingerprint); text sudah dinormalisasi
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.executemany('''
+        INSERT OR IGNORE INTO documents (id, name, text, char_count, normalization)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(doc_id, name, text, len(text), normalization) for doc_id, name, text, _ in entries])
+    c.executemany('''
+        INSERT OR REPLACE INTO fingerprints
+        (doc_id, k, window_size, engine_version, fingerprint_count, data)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        (doc_id, k, window_size, engine_version(hasher), len(fp), pack_fingerprint(fp))
+        for doc_id, _, _, fp in entries
+    ])
+    # Hanya dokumen korpus yang diindeks untuk /search
+    keys = corpus_keys(c, [doc_id for doc_id, _, _, _ in entries])
+    if keys:
+        params_id = fingerprint_params_id(c, k, window_size, engine_version(hasher))
+        for doc_id, _, _, fp in entries:
+            if doc_id in keys:
+                index_fingerprint(c, params_id, keys[doc_id], fp)
+    conn.commit()
+    conn.close()
+
+def add_to_corpus(doc_id):
+    # Dokumen dari endpoint ingest masuk korpus /search; fingerprint yang
+    # sudah tersimpan untuk dokumen ini langsung diindeks
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('INSERT OR IGNORE INTO corpus_documents (doc_id) VALUES (?)', (doc_id,))
+    if c.rowcount == 1:
+        doc_key = c.lastrowid
+        rows = c.execute(
+            'SELECT k, window_size, engine_version, data FROM fingerprints WHERE doc_id = ?', (doc_id,)
+        ).fetchall()
+        for k, window_size, version, blob in rows:
+            index_fingerprint(
+                c, fingerprint_params_id(c, k, window_size, version), doc_key,
+                unpack_fingerprint(blob, 'python')
+            )
+    conn.commit()
+    conn.close()
+
+def rebuild_fingerprint_index():
+    # Mengisi posting untuk dokumen korpus bila indeks masih kosong
+    # (database lama atau hasil migrasi dari fingerprint_index)
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    if c.execute('SELECT 1 FROM fingerprint_postings LIMIT 1').fetchone():
+        conn.close()
+        return
+    rows = c.execute('''
+        SELECT cd.doc_key, f.k, f.window_size, f.engine_version, f.data
+        FROM corpus_documents cd
+        JOIN fingerprints f ON f.doc_id = cd.doc_id
+    ''').fetchall()
+    for doc_key, k, window_size, version, blob in rows:
+        index_fingerprint(
+            c, fingerprint_params_id(c, k, window_size, version), doc_key,
+            unpack_fingerprint(blob, 'python')
+        )
+    conn.commit()
+    conn.close()
+
+rebuild_fingerprint_index()
+
+def search_corpus(fingerprint, k, window_size, hasher=DEFAULT_HASHER, top_n=10, exclude=()):
+    # Biaya query sebanding dengan jumlah posting fingerprint dokumen,
+    # bukan ukuran korpus: setiap hash dicari lewat primary key indeks.
+    version = engine_version(hasher)
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        'SELECT id FROM fingerprint_params WHERE k = ? AND window_size = ? AND engine_version = ?',
+        (k, window_size, version)
+    )
+    params = c.fetchone()
+    if params is None:
+        conn.close()
+        return []
+    c.execute('CREATE TEMP TABLE query_hashes (hash INTEGER PRIMARY KEY)')
+    c.executemany('INSERT OR IGNORE INTO query_hashes (hash) VALUES (?)',
+                  ((h,) for h in signed_hashes(fingerprint)))
+    c.execute('''
+        SELECT cd.doc_id, m.shared, f.fingerprint_count, d.name
+        FROM (
+            SELECT p.doc_key, COUNT(*) AS shared
+            FROM query_hashes q
+            CROSS JOIN fingerprint_postings p
+            WHERE p.params_id = ? AND p.hash = q.hash
+            GROUP BY p.doc_key
+        ) m
+        JOIN corpus_documents cd ON cd.doc_key = m.doc_key
+        JOIN fingerprints f
+            ON f.doc_id = cd.doc_id AND f.k = ? AND f.window_size = ? AND f.engine_version = ?
+        LEFT JOIN documents d ON d.id = cd.doc_id
+    ''', (params[0], k, window_size, version))
+    rows = c.fetchall()
+    c.execute('DROP TABLE query_hashes')
+    conn.close()
+
+    matches = []
+    for doc_id, shared, count, name in rows:
+        if doc_id in exclude:
+            continue
+        union = len(fingerprint) + count - shared
+        matches.append({
+            'doc_id': doc_id,
+            'name': name,
+            'shared_fingerprints': shared,
+            'similarity': shared / union * 100 if union else 0.0,
+        })
+    matches.sort(key=lambda m: m['similarity'], reverse=True)
+    return matches[:top_n]
+
+def query_documents(column, doc_ids):
+    doc_ids = list(doc_ids)
+    found = {}
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    for start in range(0, len(doc_ids), SQLITE_MAX_PARAMS):
+        chunk = doc_ids[start:start + SQLITE_MAX_PARAMS]
+        placeholders = ', '.join('?' * len(chunk))
+        c.execute(f'SELECT id, {column} FROM documents WHERE id IN ({placeholders})', chunk)
+        found.update(c.fetchall())
+    conn.close()
+    return found
+
+def stored_document_names(doc_ids):
+    return query_documents('name', doc_ids)
+
+def stored_document_normalizations(doc_ids):
+    return query_documents('normalization', doc_ids)
+
+def load_document_texts(doc_ids):
+    return query_documents('text', doc_ids)
+
+def store_document(doc_id, name, text, normalization=DEFAULT_NORMALIZATION):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('''
+        INSERT OR IGNORE INTO documents (id, name, text, char_count, normalization)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (doc_id, name, text, len(text), normalization))
+    conn.commit()
+    conn.close()
+
+def resolve_document_refs(documents):
+    # Entri dokumen berisi 'text', atau 'id' dokumen yang sudah tersimpan
+    # (dari /extract-text atau /documents) tanpa mengirim ulang teksnya
+    if not isinstance(documents, list):
+        raise ValueError('documents harus berupa list')
+    refs = []
+    for doc in documents:
+        if not isinstance(doc, dict) or ('text' not in doc and 'id' not in doc):
+            raise ValueError('Setiap dokumen harus berisi text atau id')
+        if 'text' not in doc:
+            refs.append(doc['id'])
+    names = stored_document_names(refs)
+    for doc_id in refs:
+        if doc_id not in names:
+            raise LookupError(f'Dokumen tidak ditemukan: {doc_id}')
+    return [
+        doc if 'text' in doc else {'id': doc['id'], 'name': doc.get('name', names[doc['id']])}
+        for doc in documents
+    ]
+
+# --- Pool proses worker ---
+# Dibuat sekali per proses worker gunicorn (bukan per request) dan langsung
+# dipanaskan: semua proses anak dijalankan saat pool dibuat. Set
+# WORKER_POOL_WARMUP=1 agar pool sudah siap saat worker gunicorn boot.
+WORKER_PROCESSES = int(os.environ.get('WORKER_PROCESSES', os.cpu_count() or 1))
+
+_worker_pool = None
+_worker_pool_pid = None
+_worker_pool_lock = threading.Lock()
+
+def warm_worker():
+    return os.getpid()
+
+def get_worker_pool():
+    global _worker_pool, _worker_pool_pid
+    with _worker_pool_lock:
+        if _worker_pool is None or _worker_pool_pid != os.getpid():
+            # Resource tracker harus sudah jalan sebelum fork agar proses
+            # anak memakai tracker yang sama untuk shared memory
+            resource_tracker.ensure_running()
+            _worker_pool = ProcessPoolExecutor(max_workers=WORKER_PROCESSES)
+            _worker_pool_pid = os.getpid()
+            for _ in range(WORKER_PROCESSES):
+                _worker_pool.submit(warm_worker)
+        return _worker_pool
+
+def reset_worker_pool(broken=None):
+    # broken: pool yang gagal; bila pool itu sudah diganti, pool baru
+    # tidak ikut dimatikan
+    global _worker_pool
+    with _worker_pool_lock:
+        if broken is not None and _worker_pool is not broken:
+            return
+        if _worker_pool is not None and _worker_pool_pid == os.getpid():
+            _worker_pool.shutdown(wait=False, cancel_futures=True)
+        _worker_pool = None
+
+# --- Tahap fingerprint per request ---
+# Setiap dokumen cukup di-fingerprint sekali per request; loop pasangan
+# hanya memakai himpunan ringkas hasil tahap ini. Dokumen besar dikerjakan
+# paralel di pool proses.
+PARALLEL_MIN_CHARS = int(os.environ.get('PARALLEL_MIN_CHARS', 200_000))
+
+def compute_fingerprints(texts, k, window_size, hasher=DEFAULT_HASHER, engine=DEFAULT_ENGINE):
+    parallel = (
+        WORKER_PROCESSES > 1
+        and len(texts) > 1
+        and sum(map(len, texts)) >= PARALLEL_MIN_CHARS
+    )
+    if parallel:
+        try:
+            pool = get_worker_pool()
+            # Dokumen terpanjang dikirim lebih dulu agar total waktu
+            # mendekati waktu dokumen terbesar
+            order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+            futures = {
+                i: pool.submit(compact_fingerprint, texts[i], k, window_size, hasher, engine)
+                for i in order
+            }
+            return [futures[i].result() for i in range(len(texts))]
+        except BrokenProcessPool:
+            reset_worker_pool()
+
+    return [compact_fingerprint(text, k, window_size, hasher, engine) for text in texts]
+
+def fingerprint_documents(texts, k, window_size, hasher=DEFAULT_HASHER, engine=DEFAULT_ENGINE,
+                          normalization=DEFAULT_NORMALIZATION, names=None, doc_ids=None, store=True):
+    # texts[i] boleh None bila doc_ids[i] berisi id dokumen tersimpan; teksnya
+    # hanya dibaca dari tabel documents jika fingerprint-nya belum ada.
+    # store=False: fingerprint yang baru dihitung tidak disimpan ke korpus
+    names = names or [None] * len(texts)
+    doc_ids = doc_ids or [None] * len(texts)
+    texts = [normalize_text(text, normalization) if text is not None else None for text in texts]
+    # Id dokumen tersimpan adalah digest teks dengan mode normalisasi saat
+    # disimpan. Bila mode request berbeda, teksnya dinormalisasi ulang dan
+    # id dihitung ulang, agar fingerprint mode lain tidak ikut terpakai.
+    refs = [doc_id for text, doc_id in zip(texts, doc_ids) if text is None]
+    modes = stored_document_normalizations(refs)
+    renormalized = {
+        doc_id: normalize_text(text, normalization)
+        for doc_id, text in load_document_texts(
+            [doc_id for doc_id in refs if modes.get(doc_id) != normalization]
+        ).items()
+    }
+    texts = [
+        renormalized.get(doc_id) if text is None else text
+        for text, doc_id in zip(texts, doc_ids)
+    ]
+    doc_ids = [
+        content_digest(text) if text is not None else doc_id
+        for text, doc_id in zip(texts, doc_ids)
+    ]
+    keys = [(doc_id, k, window_size, hasher, normalization) for doc_id in doc_ids]
+    fingerprints = [fingerprint_cache.get(key) for key in keys]
+
+    # Urutan pencarian: cache memori -> tabel fingerprints -> hitung ulang.
+    # Dokumen identik dalam satu request cukup diproses sekali.
+    pending = {}
+    for doc_id, name, text, fp in zip(doc_ids, names, texts, fingerprints):
+        if fp is None:
+            pending.setdefault(doc_id, (name, text))
+    if pending:
+        resolved = load_fingerprints(pending, k, window_size, hasher, engine)
+        missing = [doc_id for doc_id in pending if doc_id not in resolved]
+        stored_texts = load_document_texts([doc_id for doc_id in missing if pending[doc_id][1] is None])
+        for doc_id, text in stored_texts.items():
+            pending[doc_id] = (pending[doc_id][0], normalize_text(text, normalization))
+        if missing:
+            computed = compute_fingerprints(
+                [pending[doc_id][1] for doc_id in missing], k, window_size, hasher, engine
+            )
+            resolved.update(zip(missing, computed))
+        if missing and store:
+            store_fingerprints(
+                [(doc_id, *pending[doc_id], resolved[doc_id]) for doc_id in missing],
+                k, window_size, hasher, normalization
+            )
+        # Cache hanya berisi fingerprint yang dokumennya ada di tabel documents
+        for doc_id in pending:
+            if store or doc_id not in missing:
+                fingerprint_cache.put((doc_id, k, window_size, hasher, normalization), resolved[doc_id])
+        fingerprints = [
+            fp if fp is not None else resolved[doc_id]
+            for doc_id, fp in zip(doc_ids, fingerprints)
+        ]
+
+    return doc_ids, fingerprints
+
+# --- Perhitungan kemiripan semua pasangan ---
+# Setiap strategi menerima (fingerprints, stats, options) dan menghasilkan
+# (i, j, similarity) dengan i < j, berurutan seperti loop pasangan biasa,
+# hanya untuk pasangan dengan similarity >= options['min_similarity'].
+# stats diisi jumlah pasangan total, yang dihitung, dan yang dilewati.
+DEFAULT_PAIR_STRATEGY = os.environ.get('PAIR_STRATEGY', 'index')
+
+def pair_count(n):
+    return n * (n - 1) // 2
+
+def similarity_upper_bound(size1, size2):
+    # Jaccard tidak mungkin melebihi min(|A|, |B|) / max(|A|, |B|)
+    largest = max(size1, size2)
+    return min(size1, size2) / largest * 100 if largest else 0.0
+
+def bounded_pairs(fingerprints, pairs, stats, options):
+    for i, j in pairs:
+        if similarity_upper_bound(len(fingerprints[i]), len(fingerprints[j])) < options['min_similarity']:
+            stats['pruned_pairs'] += 1
+            continue
+        stats['compared_pairs'] += 1
+        yield i, j
+
+def exact_similarities(fingerprints, pairs, stats, options, pair_total):
+    if WORKER_PROCESSES > 1 and pair_total >= PARALLEL_MIN_PAIRS:
+        yield from parallel_exact_similarities(fingerprints, pairs, stats, options)
+        return
+    for i, j in bounded_pairs(fingerprints, pairs, stats, options):
+        similarity = jaccard_similarity(fingerprints[i], fingerprints[j])
+        if similarity >= options['min_similarity']:
+            yield i, j, similarity
+
+# --- Perbandingan pasangan paralel ---
+# Semua himpunan fingerprint disalin sekali ke satu segmen shared memory
+# (uint64 bersambung + offset). Pasangan dibagi menjadi blok berukuran
+# PAIR_BLOCK_SIZE; setiap proses worker menempel ke segmen itu berdasarkan
+# nama dan menghitung Jaccard satu blok. Jumlah blok yang sedang berjalan
+# dibatasi agar memori tetap datar, dan hasil dikembalikan sesuai urutan.
+PARALLEL_MIN_PAIRS = int(os.environ.get('PARALLEL_MIN_PAIRS', 5000))
+PAIR_BLOCK_SIZE = int(os.environ.get('PAIR_BLOCK_SIZE', 4096))
+
+def share_fingerprints(fingerprints):
+    offsets = [0]
+    for fp in fingerprints:
+        offsets.append(offsets[-1] + len(fp))
+    shm = shared_memory.SharedMemory(create=True, size=max(offsets[-1], 1) * 8)
+    for fp, start in zip(fingerprints, offsets):
+        if len(fp):
+            shm.buf[start * 8:(start + len(fp)) * 8] = memoryview(fp).cast('B')
+    return shm, offsets
+
+def shared_fingerprint_view(buf, total):
+    if np is not None:
+        return np.ndarray((total,), dtype=np.uint64, buffer=buf)
+    return buf.cast('Q')[:total]
+
+def compare_pair_block(shm_name, offsets, pairs):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        data = shared_fingerprint_view(shm.buf, offsets[-1])
+        results = [
+            (i, j, jaccard_similarity(data[offsets[i]:offsets[i + 1]], data[offsets[j]:offsets[j + 1]]))
+            for i, j in pairs
+        ]
+        del data
+        return results
+    finally:
+        shm.close()
+
+def compare_pair_block_serial(fingerprints, pairs):
+    return [(i, j, jaccard_similarity(fingerprints[i], fingerprints[j])) for i, j in pairs]
+
+def parallel_exact_similarities(fingerprints, pairs, stats, options):
+    shm, offsets = share_fingerprints(fingerprints)
+    candidates = bounded_pairs(fingerprints, pairs, stats, options)
+    blocks = iter(lambda: list(islice(candidates, PAIR_BLOCK_SIZE)), [])
+    pending = deque()
+    pool = get_worker_pool()
+
+    def block_results(block, future):
+        if future is not None:
+            try:
+                return future.result()
+            except BrokenProcessPool:
+                reset_worker_pool()
+        return compare_pair_block_serial(fingerprints, block)
+
+    try:
+        for block in blocks:
+            future = None
+            if pool is not None:
+                try:
+                    future = pool.submit(compare_pair_block, shm.name, offsets, block)
+                except BrokenProcessPool:
+                    reset_worker_pool()
+                    pool = None
+            pending.append((block, future))
+            while len(pending) > WORKER_PROCESSES * 2 or (pending and pending[0][1] is None):
+                for i, j, similarity in block_results(*pending.popleft()):
+                    if similarity >= options['min_similarity']:
+                        yield i, j, similarity
+        while pending:
+            for i, j, similarity in block_results(*pending.popleft()):
+                if similarity >= options['min_similarity']:
+                    yield i, j, similarity
+    finally:
+        for _, future in pending:
+            if future is not None:
+                future.cancel()
+        shm.close()
+        shm.unlink()
+
+def pairwise_similarities(fingerprints, stats, options):
+    stats.update(total_pairs=pair_count(len(fingerprints)), compared_pairs=0, pruned_pairs=0)
+    yield from exact_similarities(
+        fingerprints, combinations(range(len(fingerprints)), 2), stats, options,
+        pair_total=stats['total_pairs']
+    )
+
+def shared_fingerprint_counts(fingerprints):
+    # Indeks terbalik fingerprint -> dokumen; setiap posting yang dimiliki
+    # lebih dari satu dokumen menambah jumlah irisan semua pasangannya.
+    common = Counter()
+    if np is not None:
+        sizes = [len(fp) for fp in fingerprints]
+        if sum(sizes) == 0:
+            return common
+        hashes = np.concatenate([np.frombuffer(fp, dtype=np.uint64) for fp in fingerprints])
+        owners = np.repeat(np.arange(len(fingerprints)), sizes)
+        order = np.argsort(hashes, kind='stable')
+        hashes, owners = hashes[order], owners[order]
+        boundaries = np.flatnonzero(hashes[1:] != hashes[:-1]) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(hashes)]))
+        shared = ends - starts > 1
+        owners = owners.tolist()
+        for start, end in zip(starts[shared].tolist(), ends[shared].tolist()):
+            common.update(combinations(owners[start:end], 2))
+        return common
+
+    postings = defaultdict(list)
+    for doc, fp in enumerate(fingerprints):
+        for h in fp:
+            postings[h].append(doc)
+    for docs in postings.values():
+        if len(docs) > 1:
+            common.update(combinations(docs, 2))
+    return common
+
+def indexed_similarities(fingerprints, stats, options):
+    stats.update(total_pairs=pair_count(len(fingerprints)), compared_pairs=0, pruned_pairs=0)
+    common = shared_fingerprint_counts(fingerprints)
+    sizes = [len(fp) for fp in fingerprints]
+    for i in range(len(fingerprints)):
+        for j in range(i + 1, len(fingerprints)):
+            if similarity_upper_bound(sizes[i], sizes[j]) < options['min_similarity']:
+                stats['pruned_pairs'] += 1
+                continue
+            stats['compared_pairs'] += 1
+            shared = common.get((i, j), 0)
+            union = sizes[i] + sizes[j] - shared
+            similarity = shared / union * 100 if union else 0.0
+            if similarity >= options['min_similarity']:
+                yield i, j, similarity
+
+# --- MinHash + LSH (mode perkiraan) ---
+# Signature MinHash dihitung dari himpunan fingerprint winnowing memakai
+# keluarga permutasi splitmix64(h ^ seed). Banding LSH memilih kandidat
+# pasangan yang kemungkinan melewati lsh_threshold; Jaccard eksak hanya
+# dihitung untuk kandidat tersebut.
+MINHASH_PERMUTATIONS = int(os.environ.get('MINHASH_PERMUTATIONS', 128))
+DEFAULT_LSH_THRESHOLD = float(os.environ.get('LSH_THRESHOLD', 30))
+
+def splitmix64(x):
+    x = (x + 0x9E3779B97F4A7C15) & HASH_MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & HASH_MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & HASH_MASK
+    return x ^ (x >> 31)
+
+def splitmix64_numpy(x):
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+MINHASH_SEEDS = [splitmix64(i) for i in range(MINHASH_PERMUTATIONS)]
+
+def minhash_signature(fingerprint):
+    if np is not None:
+        hashes = np.frombuffer(fingerprint, dtype=np.uint64)
+        return [int(splitmix64_numpy(hashes ^ np.uint64(seed)).min()) for seed in MINHASH_SEEDS]
+    return [min(splitmix64(h ^ seed) for h in fingerprint) for seed in MINHASH_SEEDS]
+
+@lru_cache(maxsize=None)
+def lsh_parameters(threshold, num_perm):
+    # (bands, rows) yang meminimalkan luas false positive + false negative
+    # kurva S 1 - (1 - s^rows)^bands di sekitar threshold (0..1)
+    def area(bands, rows, start, end, above):
+        steps = 100
+        width = (end - start) / steps
+        total = 0.0
+        for step in range(steps):
+            s = start + (step + 0.5) * width
+            p = 1 - (1 - s ** rows) ** bands
+            total += (1 - p if above else p) * width
+        return total
+
+    best, best_error = (1, num_perm), None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            error = area(bands, rows, 0.0, threshold, False) + area(bands, rows, threshold, 1.0, True)
+            if best_error is None or error < best_error:
+                best, best_error = (bands, rows), error
+    return best
+
+def minhash_similarities(fingerprints, stats, options):
+    bands, rows = lsh_parameters(options['lsh_threshold'] / 100, MINHASH_PERMUTATIONS)
+    candidates = set()
+    signatures = [minhash_signature(fp) if len(fp) else None for fp in fingerprints]
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for doc, signature in enumerate(signatures):
+            if signature is not None:
+                buckets[tuple(signature[band * rows:(band + 1) * rows])].append(doc)
+        for docs in buckets.values():
+            if len(docs) > 1:
+                candidates.update(combinations(docs, 2))
+
+    total = pair_count(len(fingerprints))
+    stats.update(total_pairs=total, compared_pairs=0, pruned_pairs=total - len(candidates))
+    yield from exact_similarities(
+        fingerprints, sorted(candidates), stats, options, pair_total=len(candidates)
+    )
+
+PAIR_STRATEGIES = {
+    'pairwise': pairwise_similarities,
+    'index': indexed_similarities,
+    'minhash': minhash_similarities,
+}
+
+def incremental_similarities(fingerprints, stats, options, new_from):
+    # Hanya pasangan yang melibatkan dokumen baru (indeks >= new_from)
+    n = len(fingerprints)
+    total = pair_count(n) - pair_count(new_from)
+    stats.update(total_pairs=total, compared_pairs=0, pruned_pairs=0)
+    pairs = ((i, j) for i in range(n) for j in range(max(i + 1, new_from), n))
+    yield from exact_similarities(fingerprints, pairs, stats, options, pair_total=total)
+
+def select_similarities(fingerprints, stats, options, new_from=0):
+    # Salinan options: batas top-k di bawah ikut dibaca oleh strategi
+    options = dict(options)
+    if new_from:
+        pairs = incremental_similarities(fingerprints, stats, options, new_from)
+    else:
+        pairs = PAIR_STRATEGIES[options['strategy']](fingerprints, stats, options)
+    top_k = options['top_k']
+    if top_k is None:
+        yield from pairs
+        return
+
+    # Simpan k pasangan terbaik di min-heap. Setelah heap penuh, nilai
+    # terkecilnya menjadi batas bawah baru sehingga strategi bisa menolak
+    # lebih banyak pasangan lewat batas ukuran.
+    heap = []
+    for i, j, similarity in pairs:
+        item = (similarity, -i, -j)
+        if len(heap) < top_k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+        if len(heap) == top_k:
+            options['min_similarity'] = max(options['min_similarity'], heap[0][0])
+    for similarity, i, j in sorted(heap, reverse=True):
+        yield -i, -j, similarity
+
+# --- Backend ekstraksi PDF ---
+# Setiap extractor menyediakan page_count(path) dan iter_pages(path, start,
+# stop) yang menghasilkan teks per halaman (diakhiri baris baru, seperti
+# keluaran PyMuPDF). Dipilih per request lewat field 'extractor' atau
+# default PDF_EXTRACTOR.
+DEFAULT_EXTRACTOR = os.environ.get('PDF_EXTRACTOR', 'pymupdf')
+
+EXTRACTORS = {}
+
+def register_extractor(cls):
+    EXTRACTORS[cls.name] = cls()
+    return cls
+
+@register_extractor
+class PyMuPDFExtractor:
+    name = 'pymupdf'
+    version = f'pymupdf-{fitz.VersionBind}'
+
+    def page_count(self, path):
+        with fitz.open(path, filetype='pdf') as doc:
+            return doc.page_count
+
+    def iter_pages(self, path, start=0, stop=None):
+        with fitz.open(path, filetype='pdf') as doc:
+            for number in range(start, doc.page_count if stop is None else stop):
+                yield doc[number].get_text()
+
+if pdfium is not None:
+    @register_extractor
+    class PdfiumExtractor:
+        name = 'pypdfium2'
+        version = f'pypdfium2-{pdfium.PYPDFIUM_INFO}'
+
+        def page_count(self, path):
+            pdf = pdfium.PdfDocument(path)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+
+        def iter_pages(self, path, start=0, stop=None):
+            pdf = pdfium.PdfDocument(path)
+            try:
+                for number in range(start, len(pdf) if stop is None else stop):
+                    page = pdf[number]
+                    textpage = page.get_textpage()
+                    try:
+                        yield textpage.get_text_range() + '\n'
+                    finally:
+                        textpage.close()
+                        page.close()
+            finally:
+                pdf.close()
+
+if pdfplumber is not None:
+    @register_extractor
+    class PdfplumberExtractor:
+        name = 'pdfplumber'
+        version = f'pdfplumber-{pdfplumber.__version__}'
+
+        def page_count(self, path):
+            with pdfplumber.open(path) as pdf:
+                return len(pdf.pages)
+
+        def iter_pages(self, path, start=0, stop=None):
+            with pdfplumber.open(path) as pdf:
+                for page in pdf.pages[start:stop]:
+                    yield (page.extract_text() or '') + '\n'
+                    page.close()
+
+# --- Ekstraksi teks PDF ---
+# Unggahan ditulis per potongan ke file sementara di UPLOAD_FOLDER lalu
+# dibuka lewat path, jadi memori puncak tidak bergantung ukuran file.
+# Dokumen dengan halaman lebih dari PARALLEL_EXTRACT_MIN_PAGES dibagi
+# menjadi rentang halaman di pool proses. Setiap worker membuka sendiri
+# file PDF tersebut, lalu teks per rentang disusun kembali sesuai urutan.
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+PARALLEL_EXTRACT_MIN_PAGES = int(os.environ.get('PARALLEL_EXTRACT_MIN_PAGES', 64))
+
+@contextmanager
+def spooled_upload(upload):
+    # Menghasilkan (path, sha256 isi file); digest dihitung sambil menulis
+    digest = hashlib.sha256()
+    spool = tempfile.NamedTemporaryFile(dir=UPLOAD_FOLDER, suffix='.pdf', delete=False)
+    try:
+        with spool:
+            while chunk := upload.stream.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                spool.write(chunk)
+        yield spool.name, digest.hexdigest()
+    finally:
+        os.remove(spool.name)
+
+# --- Batas ekstraksi ---
+# Field form 'pages' ("1-5,8,10-", nomor mulai 1), 'max_pages' dan
+# 'time_budget' (detik); dua terakhir tidak bisa melebihi batas server
+# MAX_EXTRACT_PAGES / EXTRACT_TIME_BUDGET. Batas waktu diperiksa di antara
+# halaman: bila terlewati, ekstraksi berhenti dan teks sebagian dikembalikan
+# dengan 'truncated' berisi alasannya ('max_pages' atau 'time_budget').
+MAX_EXTRACT_PAGES = int(os.environ.get('MAX_EXTRACT_PAGES', 1000))
+EXTRACT_TIME_BUDGET = float(os.environ.get('EXTRACT_TIME_BUDGET', 120))
+
+DEFAULT_EXTRACTION_LIMITS = {
+    'pages': None,
+    'max_pages': MAX_EXTRACT_PAGES,
+    'time_budget': EXTRACT_TIME_BUDGET,
+    'cacheable': True,
+}
+
+def parse_page_ranges(spec):
+    # "1-5,8,10-" -> [(0, 5), (7, 8), (9, None)]
+    spans = []
+    for part in spec.split(','):
+        start, separator, stop = part.strip().partition('-')
+        try:
+            start = int(start)
+            stop = (int(stop) if stop else None) if separator else start
+        except ValueError:
+            raise ValueError(f'Rentang halaman tidak valid: {part}')
+        if start < 1 or (stop is not None and stop < start):
+            raise ValueError(f'Rentang halaman tidak valid: {part}')
+        spans.append((start - 1, stop))
+    return spans
+
+def extraction_limits(form):
+    limits = dict(DEFAULT_EXTRACTION_LIMITS)
+    if form.get('pages'):
+        limits['pages'] = parse_page_ranges(form['pages'])
+    if 'max_pages' in form:
+        try:
+            max_pages = int(form['max_pages'])
+        except ValueError:
+            max_pages = 0
+        if max_pages <= 0:
+            raise ValueError('max_pages harus bilangan bulat positif')
+        limits['max_pages'] = min(max_pages, MAX_EXTRACT_PAGES)
+    if 'time_budget' in form:
+        try:
+            time_budget = float(form['time_budget'])
+        except ValueError:
+            time_budget = 0
+        if not time_budget > 0:
+            raise ValueError('time_budget harus bilangan positif')
+        limits['time_budget'] = min(time_budget, EXTRACT_TIME_BUDGET)
+    # Cache hanya menyimpan teks utuh, jadi tidak dipakai bila klien
+    # memilih halaman atau membatasi jumlahnya
+    limits['cacheable'] = limits['pages'] is None and 'max_pages' not in form
+    return limits
+
+def limited_pages(extractor, path, limits):
+    # Mengembalikan (nomor halaman yang diekstrak, jumlah halaman PDF,
+    # alasan terpotong atau None)
+    page_count = EXTRACTORS[extractor].page_count(path)
+    if limits['pages'] is None:
+        pages = list(range(page_count))
+    else:
+        pages = sorted({
+            number
+            for start, stop in limits['pages']
+            for number in range(start, min(stop or page_count, page_count))
+        })
+    if len(pages) > limits['max_pages']:
+        return pages[:limits['max_pages']], page_count, 'max_pages'
+    return pages, page_count, None
+
+def iter_selected_pages(extractor, path, pages):
+    # Menghasilkan (nomor halaman, teks); halaman berurutan dibaca sebagai
+    # satu rentang agar PDF tidak dibuka ulang per halaman
+    run_start = 0
+    while run_start < len(pages):
+        run_stop = run_start + 1
+        while run_stop < len(pages) and pages[run_stop] == pages[run_stop - 1] + 1:
+            run_stop += 1
+        texts = EXTRACTORS[extractor].iter_pages(path, pages[run_start], pages[run_stop - 1] + 1)
+        with closing(texts):
+            yield from zip(pages[run_start:run_stop], texts)
+        run_start = run_stop
+
+def extract_pages(extractor, path, pages, deadline):
+    # Mengembalikan (teks, jumlah halaman terekstrak)
+    parts = []
+    with closing(iter_selected_pages(extractor, path, pages)) as texts:
+        for _, text in texts:
+            parts.append(text)
+            if time.time() >= deadline:
+                break
+    return ''.join(parts), len(parts)
+
+def parallel_extract_pages(extractor, path, pages, deadline):
+    pool = get_worker_pool()
+    step = -(-len(pages) // WORKER_PROCESSES)
+    chunks = [pages[start:start + step] for start in range(0, len(pages), step)]
+    futures = [pool.submit(extract_pages, extractor, path, chunk, deadline) for chunk in chunks]
+    # Potongan disusun sesuai urutan; setelah potongan pertama yang
+    # terhenti, sisanya dibuang agar teks tetap berupa awalan utuh
+    parts, done = [], 0
+    try:
+        for chunk, future in zip(chunks, futures):
+            chunk_text, chunk_done = future.result()
+            parts.append(chunk_text)
+            done += chunk_done
+            if chunk_done < len(chunk):
+                break
+    finally:
+        for future in futures:
+            future.cancel()
+    return ''.join(parts), done
+
+def extract_pdf_text(path, extractor=DEFAULT_EXTRACTOR, limits=DEFAULT_EXTRACTION_LIMITS):
+    # Mengembalikan (teks, info); info berisi pages, page_count, truncated
+    deadline = time.time() + limits['time_budget']
+    pages, page_count, truncated = limited_pages(extractor, path, limits)
+    # Di dalam worker pool (mis. batch) ekstraksi selalu serial
+    parallel = (
+        WORKER_PROCESSES > 1 and len(pages) > PARALLEL_EXTRACT_MIN_PAGES
+        and multiprocessing.parent_process() is None
+    )
+    text = None
+    if parallel:
+        try:
+            text, done = parallel_extract_pages(extractor, path, pages, deadline)
+        except BrokenProcessPool:
+            reset_worker_pool()
+    if text is None:
+        text, done = extract_pages(extractor, path, pages, deadline)
+    if done < len(pages):
+        truncated = 'time_budget'
+    return text, {'pages': done, 'page_count': page_count, 'truncated': truncated}
+
+# --- Cache hasil ekstraksi ---
+# Kunci: (sha256 byte PDF, versi extractor). PDF yang sama tidak diparse
+# ulang selama versi extractor tidak berubah.
+EXTRACTION_CACHE_VERSION = 1
+
+def extractor_version(extractor):
+    return f'{EXTRACTORS[extractor].version}-v{EXTRACTION_CACHE_VERSION}'
+
+def load_cached_extraction(digest, extractor=DEFAULT_EXTRACTOR):
+    # Mengembalikan (teks, info) atau (None, None). Isi cache selalu seluruh
+    # dokumen, jadi pages = page_count. Baris lama tanpa page_count dianggap
+    # miss agar diekstrak dan disimpan ulang lengkap.
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('''
+        SELECT text, page_count FROM extraction_cache
+        WHERE digest = ? AND extractor_version = ? AND page_count IS NOT NULL
+    ''', (digest, extractor_version(extractor)))
+    row = c.fetchone()
+    conn.close()
+    if not row:
+        return None, None
+    text, page_count = row
+    return text, {'cached': True, 'pages': page_count, 'page_count': page_count, 'truncated': None}
+
+def store_cached_extraction(digest, text, page_count, extractor=DEFAULT_EXTRACTOR):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('''
+        INSERT OR REPLACE INTO extraction_cache (digest, extractor_version, text, page_count)
+        VALUES (?, ?, ?, ?)
+    ''', (digest, extractor_version(extractor), text, page_count))
+    conn.commit()
+    conn.close()
+
+def cache_extraction(digest, text, info, extractor, limits):
+    # Hanya teks seluruh dokumen yang disimpan ke cache
+    if limits['pages'] is None and info['truncated'] is None:
+        store_cached_extraction(digest, text, info['page_count'], extractor)
+
+def extract_upload(upload, extractor=DEFAULT_EXTRACTOR, limits=DEFAULT_EXTRACTION_LIMITS):
+    # Mengembalikan (teks, info); info['cached'] menandai cache hit
+    with spooled_upload(upload) as (path, digest):
+        if limits['cacheable']:
+            text, info = load_cached_extraction(digest, extractor)
+            if text is not None:
+                return text, info
+        text, info = extract_pdf_text(path, extractor, limits)
+    cache_extraction(digest, text, info, extractor, limits)
+    return text, {'cached': False, **info}
+
+# --- Benchmark backend ekstraksi ---
+# flask --app app benchmark-extractors <folder>
+# Setiap backend dijalankan di proses baru agar puncak RSS terukur terpisah.
+# Yang dilaporkan adalah kenaikan puncak RSS selama ekstraksi, tanpa memori
+# import aplikasi (numpy, semua library PDF) yang sama untuk setiap backend.
+# Kesesuaian teks = kemiripan winnowing terhadap backend referensi.
+def peak_rss():
+    if resource is None:
+        return None
+    # ru_maxrss dalam KB di Linux, byte di macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+def benchmark_extractor(extractor, paths):
+    results = []
+    baseline_rss = peak_rss()
+    started = time.perf_counter()
+    for path in paths:
+        try:
+            pages = list(range(EXTRACTORS[extractor].page_count(path)))
+            results.append((len(pages), extract_pages(extractor, path, pages, float('inf'))[0]))
+        except Exception:
+            results.append((0, None))
+    elapsed = time.perf_counter() - started
+    rss_increase = peak_rss() - baseline_rss if baseline_rss is not None else None
+    return {'elapsed': elapsed, 'rss_increase': rss_increase, 'results': results}
+
+@app.cli.command('benchmark-extractors')
+@click.argument('corpus', type=click.Path(exists=True, file_okay=False))
+@click.option('--reference', default='pymupdf', help='Backend acuan untuk kesesuaian teks.')
+def benchmark_extractors(corpus, reference):
+    paths = sorted(
+        os.path.join(corpus, name) for name in os.listdir(corpus) if name.lower().endswith('.pdf')
+    )
+    if not paths:
+        raise click.ClickException('Tidak ada file PDF di folder tersebut')
+    if reference not in EXTRACTORS:
+        raise click.ClickException(f'Extractor tidak dikenal: {reference}')
+
+    reports = {}
+    for extractor in EXTRACTORS:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            reports[extractor] = pool.submit(benchmark_extractor, extractor, paths).result()
+
+    def fingerprint(text):
+        return compact_fingerprint(normalize_text(text, 'basic'), 5, 4)
+
+    reference_fps = [fingerprint(text) if text is not None else None for _, text in reports[reference]['results']]
+    click.echo(f'{len(paths)} PDF, acuan: {reference}')
+    click.echo(f"{'extractor':<12} {'halaman/s':>10} {'tambahan RSS':>13} {'kesesuaian':>11} {'gagal':>6}")
+    for extractor, report in reports.items():
+        pages = sum(count for count, _ in report['results'])
+        failed = sum(1 for _, text in report['results'] if text is None)
+        scores = [
+            jaccard_similarity(fingerprint(text), ref)
+            for (_, text), ref in zip(report['results'], reference_fps)
+            if text is not None and ref is not None
+        ]
+        rate = pages / report['elapsed'] if report['elapsed'] else 0.0
+        increase = report['rss_increase']
+        rss = f'+{increase / 1024 / 1024:.1f} MB' if increase is not None else 'n/a'
+        agreement = f'{sum(scores) / len(scores):.1f}%' if scores else 'n/a'
+        click.echo(f'{extractor:<12} {rate:>10.1f} {rss:>13} {agreement:>11} {failed:>6}')
 
 # --- Ekstrak teks PDF ---
 @app.route('/extract-text', methods=['POST'])
@@ -76,34 +1447,427 @@ def extract_text():
     if 'pdf' not in request.files:
         return jsonify({'error': 'No file part'}), 400
 
+    normalization = request.form.get('normalization', DEFAULT_NORMALIZATION)
+    if normalization not in NORMALIZERS:
+        return jsonify({'error': f'Normalisasi tidak dikenal: {normalization}'}), 400
+    extractor = request.form.get('extractor', DEFAULT_EXTRACTOR)
+    if extractor not in EXTRACTORS:
+        return jsonify({'error': f'Extractor tidak tersedia: {extractor}'}), 400
+    try:
+        limits = extraction_limits(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     pdf_file = request.files['pdf']
+    stream_format = request.form.get('stream')
+    if stream_format is not None:
+        if stream_format not in STREAM_FORMATS:
+            return jsonify({'error': f'Format stream tidak dikenal: {stream_format}'}), 400
+        return stream_extracted_pages(pdf_file, extractor, normalization, limits, stream_format)
+
     try:
-        doc = fitz.open(stream=pdf_file.read(), filetype='pdf')
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        return jsonify({'text': text})
+        text, info = extract_upload(pdf_file, extractor, limits)
+        doc_id = ingest_text(pdf_file.filename, text, normalization)
+        return jsonify({'text': text, 'id': doc_id, **info})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# --- Endpoint untuk deteksi plagiarisme ---
-@app.route('/plagiarism', methods=['POST'])
-def detect_plagiarism():
+# --- Simpan dokumen dan kembalikan id konten ---
+# Id = SHA-256 teks ternormalisasi; bisa dipakai sebagai {"id": ...} di
+# /plagiarism, /search, /jobs dan sesi agar teks tidak dikirim ulang.
+# Dokumen yang disimpan di sini juga masuk korpus /search.
+def ingest_text(name, text, normalization=DEFAULT_NORMALIZATION):
+    text = normalize_text(text, normalization)
+    doc_id = content_digest(text)
+    store_document(doc_id, name, text, normalization)
+    add_to_corpus(doc_id)
+    return doc_id
+
+# --- Ingest dokumen: ekstrak -> normalisasi -> fingerprint -> simpan ---
+# POST /documents menerima JSON {"name", "text"} atau multipart dengan satu
+# file 'pdf' (field form sama seperti /extract-text). Fingerprint untuk
+# (DEFAULT_K, DEFAULT_WINDOW_SIZE) langsung disimpan, jadi pemeriksaan
+# berikutnya dengan id dokumen tidak membaca teksnya lagi.
+def ingest_document(name, text, normalization=DEFAULT_NORMALIZATION):
+    doc_id = ingest_text(name, text, normalization)
+    _, fingerprints = fingerprint_documents(
+        [text], DEFAULT_K, DEFAULT_WINDOW_SIZE, normalization=normalization, names=[name]
+    )
+    return {
+        'id': doc_id,
+        'name': name,
+        'chars': len(normalize_text(text, normalization)),
+        'fingerprint_count': len(fingerprints[0]),
+        'k': DEFAULT_K,
+        'window_size': DEFAULT_WINDOW_SIZE,
+    }
+
+@app.route('/documents', methods=['POST'])
+def create_document():
+    if request.files:
+        return ingest_pdf()
+
     data = request.json
-    documents = data['documents']
-    k = data['k']
-    window_size = data['window_size']
-
-    similarities = []
-    session_id = datetime.now(ZoneInfo("Asia/Makassar")).isoformat()
-    for i in range(len(documents)):
-        for j in range(i + 1, len(documents)):
+    if not isinstance(data.get('text'), str):
+        return jsonify({'error': 'text harus berupa string'}), 400
+    normalization = data.get('normalization', DEFAULT_NORMALIZATION)
+    if normalization not in NORMALIZERS:
+        return jsonify({'error': f'Normalisasi tidak dikenal: {normalization}'}), 400
+
+    return jsonify(ingest_document(data.get('name'), data['text'], normalization)), 201
+
+def ingest_pdf():
+    if 'pdf' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+    normalization = request.form.get('normalization', DEFAULT_NORMALIZATION)
+    if normalization not in NORMALIZERS:
+        return jsonify({'error': f'Normalisasi tidak dikenal: {normalization}'}), 400
+    extractor = request.form.get('extractor', DEFAULT_EXTRACTOR)
+    if extractor not in EXTRACTORS:
+        return jsonify({'error': f'Extractor tidak tersedia: {extractor}'}), 400
+    try:
+        limits = extraction_limits(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    pdf_file = request.files['pdf']
+    try:
+        text, info = extract_upload(pdf_file, extractor, limits)
+        document = ingest_document(request.form.get('name', pdf_file.filename), text, normalization)
+        return jsonify({**document, **info}), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# --- Ekstraksi batch banyak PDF ---
+# Semua file (field 'pdf', maksimal MAX_BATCH_FILES) di-spool ke disk, lalu
+# yang belum ada di cache diekstrak bersamaan di pool proses (satu file per
+# worker). Hasil per file berisi teks dan id, atau 'error' bila file itu
+# gagal; kegagalan satu file tidak menggagalkan batch.
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', 200))
+
+def batch_result(index, name, digest, text, info, extractor, normalization, limits):
+    if not info['cached']:
+        cache_extraction(digest, text, info, extractor, limits)
+    doc_id = ingest_text(name, text, normalization)
+    return {'index': index, 'name': name, 'text': text, 'id': doc_id, **info}
+
+def spool_batch(files, spool):
+    # Mengembalikan (index, nama, path, digest, error) per file; file
+    # sementara terdaftar di ExitStack spool
+    spooled = []
+    for index, upload in enumerate(files):
+        try:
+            path, digest = spool.enter_context(spooled_upload(upload))
+            spooled.append((index, upload.filename, path, digest, None))
+        except Exception as e:
+            spooled.append((index, upload.filename, None, None, e))
+    return spooled
+
+def iter_batch_extractions(spooled, extractor, normalization, limits):
+    # Hasil dikirim sesuai urutan selesai; 'index' menunjuk posisi file.
+    # Bila worker mati (mis. PDF membuat library crash), semua file yang
+    # sedang diproses ikut gagal; file-file itu diulang satu per satu di pool
+    # baru, dan hanya file yang mematikan worker lagi yang mendapat error.
+    pool = get_worker_pool() if WORKER_PROCESSES > 1 else None
+    pending = {}
+    retry = []
+    for index, name, path, digest, error in spooled:
+        try:
+            if error is not None:
+                raise error
+            text, info = load_cached_extraction(digest, extractor) if limits['cacheable'] else (None, None)
+            if text is not None:
+                yield batch_result(index, name, digest, text, info, extractor, normalization, limits)
+                continue
+            # Batas waktu berlaku per file, dihitung saat worker mulai
+            if pool is not None:
+                try:
+                    future = pool.submit(extract_pdf_text, path, extractor, limits)
+                except BrokenProcessPool:
+                    reset_worker_pool(pool)
+                    pool = get_worker_pool()
+                    retry.append((index, name, path, digest))
+                    continue
+                pending[future] = (pool, index, name, path, digest)
+                continue
+            text, info = extract_pdf_text(path, extractor, limits)
+            yield batch_result(
+                index, name, digest, text, {'cached': False, **info}, extractor, normalization, limits
+            )
+        except Exception as e:
+            yield {'index': index, 'name': name, 'error': str(e)}
+
+    for future in as_completed(pending):
+        owner, index, name, path, digest = pending[future]
+        try:
+            text, info = future.result()
+            yield batch_result(
+                index, name, digest, text, {'cached': False, **info}, extractor, normalization, limits
+            )
+        except BrokenProcessPool:
+            reset_worker_pool(owner)
+            retry.append((index, name, path, digest))
+        except Exception as e:
+            yield {'index': index, 'name': name, 'error': str(e)}
+
+    for index, name, path, digest in sorted(retry):
+        pool = get_worker_pool()
+        try:
+            text, info = pool.submit(extract_pdf_text, path, extractor, limits).result()
+            yield batch_result(
+                index, name, digest, text, {'cached': False, **info}, extractor, normalization, limits
+            )
+        except BrokenProcessPool:
+            reset_worker_pool(pool)
+            yield {'index': index, 'name': name, 'error': 'Worker ekstraksi berhenti tak terduga'}
+        except Exception as e:
+            yield {'index': index, 'name': name, 'error': str(e)}
+
+@app.route('/extract-text/batch', methods=['POST'])
+def extract_text_batch():
+    files = request.files.getlist('pdf')
+    if not files:
+        return jsonify({'error': 'No file part'}), 400
+    if len(files) > MAX_BATCH_FILES:
+        return jsonify({'error': f'Maksimal {MAX_BATCH_FILES} file per batch'}), 400
+
+    normalization = request.form.get('normalization', DEFAULT_NORMALIZATION)
+    if normalization not in NORMALIZERS:
+        return jsonify({'error': f'Normalisasi tidak dikenal: {normalization}'}), 400
+    extractor = request.form.get('extractor', DEFAULT_EXTRACTOR)
+    if extractor not in EXTRACTORS:
+        return jsonify({'error': f'Extractor tidak tersedia: {extractor}'}), 400
+    stream_format = request.form.get('stream')
+    if stream_format is not None and stream_format not in STREAM_FORMATS:
+        return jsonify({'error': f'Format stream tidak dikenal: {stream_format}'}), 400
+    try:
+        limits = extraction_limits(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if stream_format is None:
+        with ExitStack() as spool:
+            results = sorted(
+                iter_batch_extractions(spool_batch(files, spool), extractor, normalization, limits),
+                key=lambda result: result['index']
+            )
+        failed = sum(1 for result in results if 'error' in result)
+        return jsonify({'results': results, 'succeeded': len(results) - failed, 'failed': failed})
+
+    # Body request ditutup setelah view selesai, jadi semua file di-spool
+    # lebih dulu; file sementara dihapus saat respons ditutup
+    spool = ExitStack()
+    spooled = spool_batch(files, spool)
+
+    def generate():
+        failed = 0
+        for result in iter_batch_extractions(spooled, extractor, normalization, limits):
+            failed += 'error' in result
+            yield format_stream_record({'type': 'result', **result}, stream_format)
+        yield format_stream_record(
+            {'type': 'done', 'succeeded': len(files) - failed, 'failed': failed}, stream_format
+        )
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    response = Response(generate(), mimetype=STREAM_FORMATS[stream_format], headers=headers)
+    response.call_on_close(spool.close)
+    return response
+
+# --- Pipeline unggahan PDF: ekstrak -> normalisasi -> fingerprint ---
+# Ekstraksi berjalan di thread terpisah (antrean 1 dokumen), sementara
+# fingerprint dokumen yang sudah diekstrak dikirim ke pool proses. Jadi
+# ekstraksi dokumen N+1 tumpang tindih dengan fingerprint dokumen N.
+# Hasilnya masuk cache dan tabel fingerprints, sehingga pemeriksaan
+# berikutnya tidak menghitung ulang.
+def iter_extracted_uploads(files, extractor=DEFAULT_EXTRACTOR, limits=DEFAULT_EXTRACTION_LIMITS):
+    results = Queue(maxsize=1)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def extract_all():
+        for upload in files:
+            try:
+                item = (upload.filename, *extract_upload(upload, extractor, limits), None)
+            except Exception as e:
+                item = (upload.filename, None, None, e)
+            if not put(item) or item[3] is not None:
+                return
+        put(None)
+
+    thread = threading.Thread(target=extract_all, daemon=True)
+    thread.start()
+    try:
+        while (item := results.get()) is not None:
+            name, text, info, error = item
+            if error is not None:
+                raise ValueError(f'Gagal mengekstrak {name}: {error}')
+            yield name, text, info
+    finally:
+        stop.set()
+
+def fingerprint_uploads(files, options, extractor=DEFAULT_EXTRACTOR, limits=DEFAULT_EXTRACTION_LIMITS):
+    k, window_size = options['k'], options['window_size']
+    hasher, engine = options['hasher'], options['engine']
+    pool = get_worker_pool() if WORKER_PROCESSES > 1 else None
+
+    documents = []
+    computing = {}
+    for name, text, info in iter_extracted_uploads(files, extractor, limits):
+        # 'extraction' berisi pages, page_count, truncated dan cached
+        documents.append({'name': name, 'text': text, 'extraction': info})
+        text = normalize_text(text, options['normalization'])
+        doc_id = content_digest(text)
+        key = (doc_id, k, window_size, hasher, options['normalization'])
+        if doc_id in computing or fingerprint_cache.get(key) is not None:
+            continue
+        stored = load_fingerprints([doc_id], k, window_size, hasher, engine)
+        if stored:
+            fingerprint_cache.put(key, stored[doc_id])
+            continue
+        future = None
+        if pool is not None:
+            try:
+                future = pool.submit(compact_fingerprint, text, k, window_size, hasher, engine)
+            except BrokenProcessPool:
+                reset_worker_pool()
+                pool = None
+        if future is None:
+            future = compact_fingerprint(text, k, window_size, hasher, engine)
+        computing[doc_id] = (name, text, future)
+
+    entries = []
+    for doc_id, (name, text, result) in computing.items():
+        if isinstance(result, Future):
+            try:
+                result = result.result()
+            except BrokenProcessPool:
+                reset_worker_pool()
+                result = compact_fingerprint(text, k, window_size, hasher, engine)
+        entries.append((doc_id, name, text, result))
+        fingerprint_cache.put((doc_id, k, window_size, hasher, options['normalization']), result)
+    if entries:
+        store_fingerprints(entries, k, window_size, hasher, options['normalization'])
+    return documents
+
+# --- Parameter fingerprint dari body request ---
+FORM_INT_FIELDS = ('k', 'window_size', 'top_k', 'top_n')
+FORM_FLOAT_FIELDS = ('min_similarity', 'lsh_threshold')
+
+def form_options(form):
+    # Field multipart selalu string; ubah ke tipe yang sama dengan body JSON
+    data = form.to_dict()
+    for field in FORM_INT_FIELDS:
+        if field in data:
+            try:
+                data[field] = int(data[field])
+            except ValueError:
+                raise ValueError(f'{field} harus bilangan bulat positif')
+    for field in FORM_FLOAT_FIELDS:
+        if field in data:
+            try:
+                data[field] = float(data[field])
+            except ValueError:
+                raise ValueError(f'{field} harus berupa angka')
+    return data
+
+# Parameter winnowing bawaan bila request tidak menyebut k / window_size;
+# fingerprint untuk pasangan ini sudah dihitung saat dokumen di-ingest
+DEFAULT_K = int(os.environ.get('WINNOWING_K', 5))
+DEFAULT_WINDOW_SIZE = int(os.environ.get('WINNOWING_WINDOW_SIZE', 4))
+
+def fingerprint_options(data):
+    options = {
+        'k': data.get('k', DEFAULT_K),
+        'window_size': data.get('window_size', DEFAULT_WINDOW_SIZE),
+        'hasher': data.get('hasher', DEFAULT_HASHER),
+        'engine': data.get('engine', DEFAULT_ENGINE),
+        'normalization': data.get('normalization', DEFAULT_NORMALIZATION),
+    }
+    for field in ('k', 'window_size'):
+        value = options[field]
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f'{field} harus bilangan bulat positif')
+    if options['hasher'] not in HASHERS:
+        raise ValueError(f"Hasher tidak dikenal: {options['hasher']}")
+    if options['engine'] not in ENGINES:
+        raise ValueError(f"Engine tidak tersedia: {options['engine']}")
+    if options['normalization'] not in NORMALIZERS:
+        raise ValueError(f"Normalisasi tidak dikenal: {options['normalization']}")
+    return options
+
+def pair_options(data):
+    options = {
+        'strategy': data.get('strategy', DEFAULT_PAIR_STRATEGY),
+        'lsh_threshold': data.get('lsh_threshold'),
+        'min_similarity': data.get('min_similarity', 0),
+        'top_k': data.get('top_k'),
+    }
+    if options['strategy'] not in PAIR_STRATEGIES:
+        raise ValueError(f"Strategi tidak dikenal: {options['strategy']}")
+    minimum = options['min_similarity']
+    if isinstance(minimum, bool) or not isinstance(minimum, (int, float)) or not 0 <= minimum <= 100:
+        raise ValueError('min_similarity harus di antara 0 dan 100')
+    # Tanpa lsh_threshold, LSH disetel ke min_similarity agar pasangan di
+    # atas batas yang diminta klien tidak terlewat
+    if options['lsh_threshold'] is None:
+        options['lsh_threshold'] = minimum or DEFAULT_LSH_THRESHOLD
+    threshold = options['lsh_threshold']
+    if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 < threshold <= 100:
+        raise ValueError('lsh_threshold harus di antara 0 dan 100')
+    top_k = options['top_k']
+    if top_k is not None and (isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1):
+        raise ValueError('top_k harus bilangan bulat positif')
+    return options
+
+# --- Pemeriksaan plagiarisme satu batch ---
+# Hasil dihasilkan satu per satu dan disimpan ke hasil_cek per
+# RESULT_BATCH_SIZE baris, sehingga memori tidak bergantung jumlah pasangan.
+RESULT_BATCH_SIZE = int(os.environ.get('RESULT_BATCH_SIZE', 500))
+
+def new_session_id():
+    return datetime.now(ZoneInfo("Asia/Makassar")).isoformat()
+
+def iter_plagiarism_results(documents, options, comparison, session_id, stats, new_from=0,
+                            save_documents=True, cancel=None):
+    # documents[:new_from] sudah ada di sesi; hanya pasangan yang melibatkan
+    # documents[new_from:] yang dihitung. save_documents=False bila posisi
+    # dokumen baru sudah dicatat (reserve_session_documents). Bila event
+    # cancel diset, iterasi berhenti dan sisa hasil tidak disimpan
+    doc_ids, fingerprints = fingerprint_documents(
+        [doc.get('text') for doc in documents], **options,
+        names=[doc['name'] for doc in documents],
+        doc_ids=[doc.get('id') for doc in documents]
+    )
+    if save_documents:
+        save_session_documents(
+            session_id, options, doc_ids[new_from:], [doc['name'] for doc in documents[new_from:]], new_from
+        )
+
+    rows = []
+    try:
+        for i, j, similarity in select_similarities(fingerprints, stats, comparison, new_from):
+            if cancel is not None and cancel.is_set():
+                raise RuntimeError('Pemeriksaan dibatalkan')
             doc1 = documents[i]
             doc2 = documents[j]
 
-            similarity = compare_documents(doc1['text'], doc2['text'], k, window_size)
+            rows.append((
+                session_id, doc1['name'], doc2['name'], doc1.get('text'), doc2.get('text'),
+                similarity, doc_ids[i], doc_ids[j]
+            ))
+            if len(rows) >= RESULT_BATCH_SIZE:
+                save_results_to_db(rows)
+                rows = []
 
-            result = {
+            yield {
                 'doc1_index': i,
                 'doc2_index': j,
                 'doc1_name': doc1['name'],
@@ -111,18 +1875,473 @@ def detect_plagiarism():
                 'similarity': similarity,
                 'session_id': session_id
             }
-            similarities.append(result)
-
-            save_result_to_db(
-                session_id=session_id,
-                doc1_name=doc1['name'],
-                doc2_name=doc2['name'],
-                doc1_text=doc1['text'],
-                doc2_text=doc2['text'],
-                similarity=similarity
+    finally:
+        if cancel is None or not cancel.is_set():
+            save_results_to_db(rows)
+
+def run_plagiarism_check(documents, options, comparison, stats=None, session_id=None, new_from=0,
+                         save_documents=True, cancel=None):
+    stats = {} if stats is None else stats
+    session_id = session_id or new_session_id()
+    similarities = list(iter_plagiarism_results(
+        documents, options, comparison, session_id, stats, new_from, save_documents, cancel
+    ))
+    return {'similarities': similarities, 'session_id': session_id, 'stats': stats}
+
+# --- Dokumen dan parameter per sesi ---
+def save_session_documents(session_id, options, doc_ids, names, start):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        'INSERT OR IGNORE INTO sessions (id, options) VALUES (?, ?)',
+        (session_id, json.dumps(options))
+    )
+    c.executemany('''
+        INSERT INTO session_documents (session_id, position, doc_id, name)
+        VALUES (?, ?, ?, ?)
+    ''', [
+        (session_id, start + offset, doc_id, name)
+        for offset, (doc_id, name) in enumerate(zip(doc_ids, names))
+    ])
+    conn.commit()
+    conn.close()
+
+def reserve_session_documents(session_id, doc_ids, names):
+    # Membaca dokumen sesi dan menambahkan dokumen baru mulai MAX(position) + 1
+    # dalam satu transaksi BEGIN IMMEDIATE, agar dua penambahan bersamaan
+    # tidak memakai posisi yang sama. Penambahan yang belakangan melihat
+    # dokumen penambahan sebelumnya, jadi pasangan keduanya tetap dihitung.
+    # Mengembalikan dokumen sesi sebelum penambahan ini.
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('''
+            SELECT position, doc_id, name FROM session_documents
+            WHERE session_id = ?
+            ORDER BY position
+        ''', (session_id,))
+        rows = c.fetchall()
+        start = rows[-1][0] + 1 if rows else 0
+        c.executemany('''
+            INSERT INTO session_documents (session_id, position, doc_id, name)
+            VALUES (?, ?, ?, ?)
+        ''', [
+            (session_id, start + offset, doc_id, name)
+            for offset, (doc_id, name) in enumerate(zip(doc_ids, names))
+        ])
+        c.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            c.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return [{'id': doc_id, 'name': name} for _, doc_id, name in rows]
+
+def load_session(session_id):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('SELECT options FROM sessions WHERE id = ?', (session_id,))
+    row = c.fetchone()
+    if not row:
+        conn.close()
+        return None, []
+    c.execute('''
+        SELECT doc_id, name FROM session_documents
+        WHERE session_id = ?
+        ORDER BY position
+    ''', (session_id,))
+    documents = [{'id': doc_id, 'name': name} for doc_id, name in c.fetchall()]
+    conn.close()
+    return json.loads(row[0]), documents
+
+# --- Keluaran streaming (NDJSON / Server-Sent Events) ---
+# Setiap record punya 'type': 'session' di awal, 'result' per pasangan,
+# lalu 'done' (berisi stats) atau 'error' di akhir.
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream',
+}
+
+def format_stream_record(record, stream_format):
+    payload = json.dumps(record)
+    if stream_format == 'sse':
+        return f"event: {record['type']}\ndata: {payload}\n\n"
+    return payload + '\n'
+
+def extraction_reports(documents):
+    # Ringkasan ekstraksi per PDF unggahan, agar teks yang terpotong oleh
+    # batas halaman/waktu terlihat di respons
+    return [
+        {'index': index, 'name': doc['name'], **doc['extraction']}
+        for index, doc in enumerate(documents) if 'extraction' in doc
+    ]
+
+def stream_plagiarism_check(documents, options, comparison, stream_format):
+    def generate():
+        stats = {}
+        session_id = new_session_id()
+        record = {'type': 'session', 'session_id': session_id}
+        if reports:
+            record['documents'] = reports
+        yield format_stream_record(record, stream_format)
+        try:
+            for result in iter_plagiarism_results(documents, options, comparison, session_id, stats):
+                yield format_stream_record({'type': 'result', **result}, stream_format)
+        except Exception as e:
+            yield format_stream_record({'type': 'error', 'error': str(e)}, stream_format)
+            return
+        yield format_stream_record(
+            {'type': 'done', 'session_id': session_id, 'stats': stats}, stream_format
+        )
+
+    reports = extraction_reports(documents)
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(generate(), mimetype=STREAM_FORMATS[stream_format], headers=headers)
+
+# --- Streaming ekstraksi per halaman ---
+# Record 'page' ({page, text}, nomor mulai 1) dikirim begitu halaman
+# selesai diekstrak, lalu 'done' berisi id dokumen dan jumlah halaman.
+# Cache ekstraksi hanya menyimpan teks utuh, jadi saat cache hit seluruh
+# teks dikirim sebagai satu record 'text'.
+def stream_extracted_pages(upload, extractor, normalization, limits, stream_format):
+    # Unggahan di-spool sebelum respons dikirim (body request sudah ditutup
+    # saat generator berjalan); file sementara dihapus saat respons ditutup
+    spool = ExitStack()
+    path, digest = spool.enter_context(spooled_upload(upload))
+
+    def generate():
+        try:
+            text, info = load_cached_extraction(digest, extractor) if limits['cacheable'] else (None, None)
+            if text is not None:
+                yield format_stream_record({'type': 'text', 'text': text}, stream_format)
+            else:
+                deadline = time.time() + limits['time_budget']
+                pages, page_count, truncated = limited_pages(extractor, path, limits)
+                parts = []
+                with closing(iter_selected_pages(extractor, path, pages)) as texts:
+                    for number, page_text in texts:
+                        parts.append(page_text)
+                        yield format_stream_record(
+                            {'type': 'page', 'page': number + 1, 'text': page_text}, stream_format
+                        )
+                        if time.time() >= deadline:
+                            break
+                if len(parts) < len(pages):
+                    truncated = 'time_budget'
+                info = {'cached': False, 'pages': len(parts), 'page_count': page_count, 'truncated': truncated}
+                text = ''.join(parts)
+                cache_extraction(digest, text, info, extractor, limits)
+            doc_id = ingest_text(upload.filename, text, normalization)
+        except Exception as e:
+            yield format_stream_record({'type': 'error', 'error': str(e)}, stream_format)
+            return
+        yield format_stream_record({'type': 'done', 'id': doc_id, **info}, stream_format)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    response = Response(generate(), mimetype=STREAM_FORMATS[stream_format], headers=headers)
+    response.call_on_close(spool.close)
+    return response
+
+# --- Endpoint untuk deteksi plagiarisme ---
+@app.route('/plagiarism', methods=['POST'])
+def detect_plagiarism():
+    # Body JSON berisi teks dokumen, atau multipart berisi file PDF (field
+    # 'pdf', boleh lebih dari satu) dengan parameter sebagai field form
+    try:
+        if request.files:
+            data = form_options(request.form)
+        else:
+            data = request.json
+        options = fingerprint_options(data)
+        comparison = pair_options(data)
+        if request.files:
+            extractor = data.get('extractor', DEFAULT_EXTRACTOR)
+            if extractor not in EXTRACTORS:
+                raise ValueError(f'Extractor tidak tersedia: {extractor}')
+            limits = extraction_limits(request.form)
+            documents = fingerprint_uploads(request.files.getlist('pdf'), options, extractor, limits)
+        else:
+            documents = resolve_document_refs(data['documents'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+
+    stream_format = data.get('stream')
+    if stream_format is not None:
+        if stream_format not in STREAM_FORMATS:
+            return jsonify({'error': f'Format stream tidak dikenal: {stream_format}'}), 400
+        return stream_plagiarism_check(documents, options, comparison, stream_format)
+
+    result = run_plagiarism_check(documents, options, comparison)
+    reports = extraction_reports(documents)
+    if reports:
+        result['documents'] = reports
+    return jsonify(result)
+
+# --- Menambah dokumen ke sesi yang sudah ada ---
+# Dokumen baru hanya dibandingkan dengan dokumen sesi (fingerprint-nya
+# sudah tersimpan) dan dengan sesamanya: O(baru x lama), bukan O(n^2).
+@app.route('/sessions/<string:session_id>/documents', methods=['POST'])
+def add_session_documents(session_id):
+    data = request.json
+    if not data.get('documents'):
+        return jsonify({'error': 'documents harus berupa list yang tidak kosong'}), 400
+    try:
+        new_documents = resolve_document_refs(data['documents'])
+        comparison = pair_options(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+
+    options, _ = load_session(session_id)
+    if options is None:
+        return jsonify({'error': 'Sesi tidak ditemukan atau tidak menyimpan dokumen'}), 404
+
+    # Dokumen baru di-fingerprint dan disimpan dulu, baru posisinya dicatat,
+    # sehingga penambahan lain yang membacanya bisa langsung memakainya
+    names = [doc['name'] for doc in new_documents]
+    doc_ids, _ = fingerprint_documents(
+        [doc.get('text') for doc in new_documents], **options,
+        names=names, doc_ids=[doc.get('id') for doc in new_documents]
+    )
+    existing = reserve_session_documents(session_id, doc_ids, names)
+    result = run_plagiarism_check(
+        existing + new_documents, options, comparison,
+        session_id=session_id, new_from=len(existing), save_documents=False
+    )
+    return jsonify(result)
+
+# --- Job asinkron untuk batch besar ---
+# Status job disimpan di tabel jobs sehingga tetap ada setelah worker
+# restart. Job dijalankan oleh thread pool lokal; job 'running' yang
+# heartbeat-nya (updated_at) lebih tua dari JOB_STALE_SECONDS dianggap
+# ditinggal worker yang mati dan dijalankan ulang.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_PROGRESS_INTERVAL = float(os.environ.get('JOB_PROGRESS_INTERVAL', 1.0))
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 60))
+# Batas tunggu kunci SQLite untuk koneksi job (default sqlite3: 5 detik)
+JOB_DB_TIMEOUT = float(os.environ.get('JOB_DB_TIMEOUT', 30))
+
+_job_executor = None
+_job_executor_pid = None
+_job_executor_lock = threading.Lock()
+
+def get_job_executor():
+    global _job_executor, _job_executor_pid
+    with _job_executor_lock:
+        if _job_executor is not None and _job_executor_pid == os.getpid():
+            return _job_executor
+        _job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+        _job_executor_pid = os.getpid()
+    recover_jobs()
+    return _job_executor
+
+def recover_jobs():
+    conn = sqlite3.connect(DB_PATH, timeout=JOB_DB_TIMEOUT)
+    c = conn.cursor()
+    c.execute('''
+        UPDATE jobs SET status = 'queued'
+        WHERE status = 'running' AND updated_at < datetime('now', ?)
+    ''', (f'-{JOB_STALE_SECONDS} seconds',))
+    conn.commit()
+    c.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at")
+    job_ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    for job_id in job_ids:
+        _job_executor.submit(run_job, job_id)
+
+def requeue_stale_job(job_id):
+    # Dipanggil setiap GET /jobs/<id>: job 'running' yang heartbeat-nya
+    # sudah basi (worker mati setelah recover_jobs berjalan) diantrekan ulang
+    conn = sqlite3.connect(DB_PATH, timeout=JOB_DB_TIMEOUT)
+    c = conn.cursor()
+    c.execute('''
+        UPDATE jobs SET status = 'queued', updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = 'running' AND updated_at < datetime('now', ?)
+    ''', (job_id, f'-{JOB_STALE_SECONDS} seconds'))
+    requeued = c.rowcount == 1
+    conn.commit()
+    conn.close()
+    if requeued:
+        get_job_executor().submit(run_job, job_id)
+
+def update_job(job_id, attempt, **fields):
+    # Hanya berlaku selama job masih 'running' dengan attempt yang sama;
+    # False berarti run ini sudah tidak memiliki job (diantrekan ulang)
+    assignments = ', '.join(f'{field} = ?' for field in fields)
+    conn = sqlite3.connect(DB_PATH, timeout=JOB_DB_TIMEOUT)
+    c = conn.cursor()
+    c.execute(
+        f'''UPDATE jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = 'running' AND attempt = ?''',
+        (*fields.values(), job_id, attempt)
+    )
+    owned = c.rowcount == 1
+    conn.commit()
+    conn.close()
+    return owned
+
+def claim_job(job_id):
+    # Mengembalikan (payload, attempt), atau None bila job sudah diklaim
+    conn = sqlite3.connect(DB_PATH, timeout=JOB_DB_TIMEOUT)
+    c = conn.cursor()
+    c.execute('''
+        UPDATE jobs SET status = 'running', attempt = attempt + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = 'queued'
+    ''', (job_id,))
+    claimed = c.rowcount == 1
+    c.execute('SELECT payload, attempt FROM jobs WHERE id = ?', (job_id,))
+    row = c.fetchone()
+    conn.commit()
+    conn.close()
+    return (json.loads(row[0]), row[1]) if claimed else None
+
+def report_job_progress(job_id, attempt, stats, stop, lost):
+    while not stop.wait(JOB_PROGRESS_INTERVAL):
+        try:
+            owned = update_job(
+                job_id, attempt,
+                pairs_done=stats.get('compared_pairs', 0) + stats.get('pruned_pairs', 0),
+                pairs_total=stats.get('total_pairs', 0)
             )
+        except sqlite3.Error:
+            # Database terkunci sementara; heartbeat dicoba lagi di detak berikutnya
+            continue
+        if not owned:
+            lost.set()
+            return
+
+def run_job(job_id):
+    claim = claim_job(job_id)
+    if claim is None:
+        return
+    data, attempt = claim
+
+    # Bila job diambil alih run lain, run ini berhenti dan sesi yang sudah
+    # ditulisnya dihapus agar hasil_cek tidak berisi hasil ganda
+    stats = {}
+    stop = threading.Event()
+    lost = threading.Event()
+    session_id = new_session_id()
+    reporter = threading.Thread(
+        target=report_job_progress, args=(job_id, attempt, stats, stop, lost), daemon=True
+    )
+    reporter.start()
+    try:
+        result = run_plagiarism_check(
+            resolve_document_refs(data['documents']), fingerprint_options(data), pair_options(data), stats,
+            session_id=session_id, cancel=lost
+        )
+    except Exception as e:
+        stop.set()
+        reporter.join()
+        if not update_job(job_id, attempt, status='failed', error=str(e)):
+            delete_session_rows(session_id)
+        return
+    stop.set()
+    reporter.join()
+    owned = update_job(
+        job_id, attempt, status='done', result=json.dumps(result),
+        pairs_done=stats.get('total_pairs', 0), pairs_total=stats.get('total_pairs', 0)
+    )
+    if not owned:
+        delete_session_rows(session_id)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    data = request.json
+    try:
+        resolve_document_refs(data.get('documents'))
+        fingerprint_options(data)
+        pair_options(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+
+    job_id = uuid.uuid4().hex
+    total = pair_count(len(data['documents']))
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO jobs (id, status, payload, pairs_total) VALUES (?, 'queued', ?, ?)
+    ''', (job_id, json.dumps(data), total))
+    conn.commit()
+    conn.close()
 
-    return jsonify({'similarities': similarities, 'session_id': session_id})
+    get_job_executor().submit(run_job, job_id)
+    return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+
+@app.route('/jobs/<string:job_id>', methods=['GET'])
+def get_job(job_id):
+    get_job_executor()
+    requeue_stale_job(job_id)
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute('''
+        SELECT id, status, pairs_done, pairs_total, result, error, created_at, updated_at
+        FROM jobs WHERE id = ?
+    ''', (job_id,))
+    row = c.fetchone()
+    conn.close()
+    if not row:
+        return jsonify({'error': 'Job tidak ditemukan'}), 404
+
+    job = {
+        'id': row['id'],
+        'status': row['status'],
+        'pairs_done': row['pairs_done'],
+        'pairs_total': row['pairs_total'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+    }
+    if row['status'] == 'done':
+        job['result'] = json.loads(row['result'])
+    if row['status'] == 'failed':
+        job['error'] = row['error']
+    return jsonify({'job': job})
+
+# --- Pencarian ke seluruh korpus dokumen (hasil endpoint ingest) ---
+@app.route('/search', methods=['POST'])
+def search_documents():
+    data = request.json
+    try:
+        options = fingerprint_options(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    top_n = data.get('top_n', 10)
+    if isinstance(top_n, bool) or not isinstance(top_n, int) or top_n < 1:
+        return jsonify({'error': 'top_n harus bilangan bulat positif'}), 400
+
+    try:
+        document = resolve_document_refs([data])[0]
+    except ValueError:
+        return jsonify({'error': 'Body harus berisi text atau id'}), 400
+    except LookupError:
+        return jsonify({'error': 'Dokumen tidak ditemukan'}), 404
+
+    # Query tidak disimpan; korpus hanya berisi dokumen dari endpoint ingest
+    # (/documents, /extract-text, /extract-text/batch)
+    doc_ids, fingerprints = fingerprint_documents(
+        [document.get('text')], **options,
+        names=[document.get('name')], doc_ids=[document.get('id')], store=False
+    )
+    doc_id, fingerprint = doc_ids[0], fingerprints[0]
+    matches = search_corpus(
+        fingerprint, options['k'], options['window_size'], options['hasher'],
+        top_n=top_n, exclude={doc_id, data.get('id')}
+    )
+    return jsonify({'doc_id': doc_id, 'matches': matches})
+
+# --- Statistik cache fingerprint ---
+@app.route('/fingerprint-cache', methods=['GET'])
+def get_fingerprint_cache_stats():
+    return jsonify({'cache': fingerprint_cache.stats()})
 
 # --- Endpoint Riwayat, dikelompokkan berdasarkan sesi ---
 @app.route('/history', methods=['GET'])
@@ -165,10 +2384,16 @@ def get_history_doc(doc_id, doc_type):
         conn = sqlite3.connect(DB_PATH)
         conn.row_factory = sqlite3.Row
         c = conn.cursor()
-        c.execute('SELECT id, doc1_name, doc2_name, doc1_text, doc2_text FROM hasil_cek WHERE id = ?', (doc_id,))
+        c.execute('SELECT id, doc1_name, doc2_name, doc1_text, doc2_text, doc1_id, doc2_id FROM hasil_cek WHERE id = ?', (doc_id,))
         row = c.fetchone()
         if not row:
             return jsonify({'error': 'Dokumen tidak ditemukan'}), 404
+        # Dokumen yang dirujuk lewat id tidak menyimpan teks di hasil_cek
+        text = row[f'{doc_type}_text']
+        if text is None and row[f'{doc_type}_id']:
+            c.execute('SELECT text FROM documents WHERE id = ?', (row[f'{doc_type}_id'],))
+            stored = c.fetchone()
+            text = stored['text'] if stored else None
     except Exception as e:
         return jsonify({'error': f'Gagal mengambil data: {str(e)}'}), 500
     finally:
@@ -178,28 +2403,34 @@ def get_history_doc(doc_id, doc_type):
         result = {
             'id': row['id'],
             'name': row['doc1_name'],
-            'text': row['doc1_text']
+            'text': text
         }
     else:
         result = {
             'id': row['id'],
             'name': row['doc2_name'],
-            'text': row['doc2_text']
+            'text': text
         }
 
     return jsonify({'dokumen': result})
 
 # --- Endpoint Menghapus Sesi ---
+def delete_session_rows(session_id):
+    # Mengembalikan jumlah baris hasil_cek yang dihapus
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('DELETE FROM hasil_cek WHERE session_id = ?', (session_id,))
+    deleted = c.rowcount
+    c.execute('DELETE FROM session_documents WHERE session_id = ?', (session_id,))
+    c.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+    conn.commit()
+    conn.close()
+    return deleted
+
 @app.route('/delete-session/<string:session_id>', methods=['DELETE'])
 def delete_session(session_id):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('DELETE FROM hasil_cek WHERE session_id = ?', (session_id,))
-        deleted = c.rowcount
-        conn.commit()
-        conn.close()
-
+        deleted = delete_session_rows(session_id)
         if deleted == 0:
             return jsonify({'message': 'Tidak ada data dengan session_id tersebut'}), 404
 
@@ -207,6 +2438,11 @@ def delete_session(session_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# --- Pemanasan pool saat worker boot ---
+if os.environ.get('WORKER_POOL_WARMUP') == '1' and WORKER_PROCESSES > 1 \
+        and multiprocessing.parent_process() is None:
+    get_worker_pool()
+
 # --- Menjalankan server ---
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=5000, debug=True)